@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Dict
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+
+class AsyncTokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self._rate = float(rate)
+        self._capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self._rate)
+
+
+# Telegram limits: ~30 messages/second overall, ~1/second per private chat,
+# ~20/minute per group or channel (negative chat ids).
+_global_bucket = AsyncTokenBucket(rate=30, capacity=30)
+_private_buckets: Dict[int, AsyncTokenBucket] = defaultdict(lambda: AsyncTokenBucket(rate=1, capacity=1))
+_group_buckets: Dict[int, AsyncTokenBucket] = defaultdict(lambda: AsyncTokenBucket(rate=20 / 60, capacity=20))
+
+
+async def safe_send(bot: Bot, chat_id: int, text: str, **kwargs: Any) -> None:
+    """Send a message within Telegram's rate limits, honouring 429 retry_after."""
+    buckets = _group_buckets if chat_id < 0 else _private_buckets
+    while True:
+        await buckets[chat_id].acquire()
+        await _global_bucket.acquire()
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
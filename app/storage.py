@@ -1,157 +1,291 @@
-from __future__ import annotations
-
-from pathlib import Path
-from typing import Dict, List, Optional, Set
-import json
-import threading
-
-
-class Storage:
-    def __init__(self, path: Path) -> None:
-        self.path = Path(path)
-        self.path.parent.mkdir(parents=True, exist_ok=True)
-        self._lock = threading.RLock()
-        if not self.path.exists():
-            self._write({
-                "subscriptions": {},
-                "last_live": {},
-                "last_live_at": {},
-                "cooldown_until": {},
-                "destinations": {}
-            })
-
-    def _read(self) -> Dict:
-        with self._lock:
-            try:
-                return json.loads(self.path.read_text(encoding="utf-8"))
-            except FileNotFoundError:
-                return {"subscriptions": {}, "last_live": {}, "last_live_at": {}, "cooldown_until": {}, "destinations": {}}
-
-    def _write(self, data: Dict) -> None:
-        with self._lock:
-            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
-            tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-            tmp.replace(self.path)
-
-    # Subscriptions mapping: chat_id -> list[channel_id]
-    def add_subscription(self, chat_id: int, channel_id: str) -> None:
-        data = self._read()
-        subs: Dict[str, List[str]] = data.get("subscriptions", {})
-        key = str(chat_id)
-        channels = set(subs.get(key, []))
-        channels.add(channel_id)
-        subs[key] = sorted(channels)
-        data["subscriptions"] = subs
-        self._write(data)
-
-    def remove_subscription(self, chat_id: int, channel_id: str) -> bool:
-        data = self._read()
-        subs: Dict[str, List[str]] = data.get("subscriptions", {})
-        key = str(chat_id)
-        channels = set(subs.get(key, []))
-        if channel_id in channels:
-            channels.remove(channel_id)
-            subs[key] = sorted(channels)
-            data["subscriptions"] = subs
-            self._write(data)
-            return True
-        return False
-
-    def list_subscriptions(self, chat_id: int) -> List[str]:
-        data = self._read()
-        return list(data.get("subscriptions", {}).get(str(chat_id), []))
-
-    def all_subscribers_for(self, channel_id: str) -> Set[int]:
-        data = self._read()
-        result: Set[int] = set()
-        for chat_id, channels in data.get("subscriptions", {}).items():
-            if channel_id in channels:
-                result.add(int(chat_id))
-        return result
-
-    def all_subscriptions(self) -> Dict[int, List[str]]:
-        data = self._read()
-        result: Dict[int, List[str]] = {}
-        for chat_id, channels in data.get("subscriptions", {}).items():
-            result[int(chat_id)] = list(channels)
-        return result
-
-    def all_channels(self) -> Set[str]:
-        data = self._read()
-        channels: Set[str] = set()
-        for lst in data.get("subscriptions", {}).values():
-            channels.update(lst)
-        # include destinations keys as tracked channels
-        channels.update(data.get("destinations", {}).keys())
-        return channels
-
-    # last_live mapping: channel_id -> video_id
-    def get_last_live(self, channel_id: str) -> Optional[str]:
-        data = self._read()
-        return data.get("last_live", {}).get(channel_id)
-
-    def set_last_live(self, channel_id: str, video_id: str) -> None:
-        data = self._read()
-        last_live: Dict[str, str] = data.get("last_live", {})
-        last_live[channel_id] = video_id
-        data["last_live"] = last_live
-        self._write(data)
-
-    # last_live_at mapping: channel_id -> ISO timestamp
-    def get_last_live_at(self, channel_id: str) -> Optional[str]:
-        data = self._read()
-        return data.get("last_live_at", {}).get(channel_id)
-
-    def set_last_live_at(self, channel_id: str, iso_ts: str) -> None:
-        data = self._read()
-        last_live_at: Dict[str, str] = data.get("last_live_at", {})
-        last_live_at[channel_id] = iso_ts
-        data["last_live_at"] = last_live_at
-        self._write(data)
-
-    # cooldown_until mapping: channel_id -> ISO timestamp
-    def get_cooldown_until(self, channel_id: str) -> Optional[str]:
-        data = self._read()
-        return data.get("cooldown_until", {}).get(channel_id)
-
-    def set_cooldown_until(self, channel_id: str, iso_ts: str) -> None:
-        data = self._read()
-        cooldown: Dict[str, str] = data.get("cooldown_until", {})
-        cooldown[channel_id] = iso_ts
-        data["cooldown_until"] = cooldown
-        self._write(data)
-
-    # destinations mapping: channel_id -> list[int chat_id]
-    def add_destination(self, channel_id: str, chat_id: int) -> None:
-        data = self._read()
-        dests: Dict[str, List[int]] = data.get("destinations", {})
-        lst = set(dests.get(channel_id, []))
-        lst.add(int(chat_id))
-        dests[channel_id] = sorted(lst)
-        data["destinations"] = dests
-        self._write(data)
-
-    def remove_destination(self, channel_id: str, chat_id: int) -> bool:
-        data = self._read()
-        dests: Dict[str, List[int]] = data.get("destinations", {})
-        lst = set(dests.get(channel_id, []))
-        if int(chat_id) in lst:
-            lst.remove(int(chat_id))
-            dests[channel_id] = sorted(lst)
-            data["destinations"] = dests
-            self._write(data)
-            return True
-        return False
-
-    def list_destinations(self, channel_id: str) -> List[int]:
-        data = self._read()
-        return list(data.get("destinations", {}).get(channel_id, []))
-
-    def clear_destinations(self, channel_id: str) -> None:
-        data = self._read()
-        dests: Dict[str, List[int]] = data.get("destinations", {})
-        if channel_id in dests:
-            dests[channel_id] = []
-            data["destinations"] = dests
-            self._write(data)
-
+from __future__ import annotations
+
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+import json
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    chat_id INTEGER NOT NULL,
+    channel_id TEXT NOT NULL,
+    PRIMARY KEY (chat_id, channel_id)
+);
+CREATE INDEX IF NOT EXISTS ix_sub_channel ON subscriptions(channel_id);
+CREATE INDEX IF NOT EXISTS ix_sub_chat ON subscriptions(chat_id);
+CREATE TABLE IF NOT EXISTS destinations (
+    channel_id TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    PRIMARY KEY (channel_id, chat_id)
+);
+CREATE INDEX IF NOT EXISTS ix_dest_channel ON destinations(channel_id);
+CREATE TABLE IF NOT EXISTS channel_state (
+    channel_id TEXT PRIMARY KEY,
+    last_live TEXT,
+    last_live_at TEXT,
+    cooldown_until TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class Storage:
+    """SQLite-backed storage with the same API as the old JSON document.
+
+    Lookups like all_subscribers_for() are indexed SELECTs instead of
+    full-document scans, and setters touch single rows (WAL mode) instead
+    of rewriting the whole file. WAL already gives append-only write
+    behaviour with automatic checkpointing, so a burst of setters (live
+    detected -> last_live, last_live_at, cooldown_until) costs three row
+    appends, not three full-document rewrites.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path = Path(path)
+        self.path = path.with_suffix(".db") if path.suffix == ".json" else path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        # Parsed-cooldown cache so the poll loop doesn't fromisoformat()
+        # the same string every tick for every channel.
+        self._cooldown_dt: Dict[str, Optional[datetime]] = {}
+        # One-time import from the legacy JSON document, if present.
+        if path.suffix == ".json" and path.exists():
+            self._import_json(path)
+
+    def _import_json(self, json_path: Path) -> None:
+        with self._lock:
+            # A durable marker records that the import ran; inferring it from
+            # row counts would re-import (and resurrect deleted data) whenever
+            # the subscriptions table happens to be empty.
+            cur = self._conn.execute("SELECT value FROM meta WHERE key='json_imported'")
+            if cur.fetchone() is not None:
+                return
+            cur = self._conn.execute("SELECT COUNT(*) FROM subscriptions")
+            if cur.fetchone()[0]:
+                # DB already populated (migrated before the marker existed)
+                self._mark_json_imported()
+                return
+            try:
+                data = json.loads(json_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                return
+            for chat_id, channels in data.get("subscriptions", {}).items():
+                for cid in channels:
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO subscriptions(chat_id, channel_id) VALUES (?, ?)",
+                        (int(chat_id), cid),
+                    )
+            for cid, chats in data.get("destinations", {}).items():
+                for chat_id in chats:
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO destinations(channel_id, chat_id) VALUES (?, ?)",
+                        (cid, int(chat_id)),
+                    )
+            channel_ids = set(data.get("last_live", {})) | set(data.get("last_live_at", {})) | set(data.get("cooldown_until", {}))
+            for cid in channel_ids:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO channel_state(channel_id, last_live, last_live_at, cooldown_until) VALUES (?, ?, ?, ?)",
+                    (
+                        cid,
+                        data.get("last_live", {}).get(cid),
+                        data.get("last_live_at", {}).get(cid),
+                        data.get("cooldown_until", {}).get(cid),
+                    ),
+                )
+            self._mark_json_imported()
+
+    def _mark_json_imported(self) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('json_imported', '1')")
+        self._conn.commit()
+
+    def _set_state(self, channel_id: str, column: str, value: Optional[str]) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO channel_state(channel_id, {column}) VALUES (?, ?) "
+                f"ON CONFLICT(channel_id) DO UPDATE SET {column}=excluded.{column}",
+                (channel_id, value),
+            )
+            self._conn.commit()
+
+    def _get_state(self, channel_id: str, column: str) -> Optional[str]:
+        with self._lock:
+            cur = self._conn.execute(f"SELECT {column} FROM channel_state WHERE channel_id=?", (channel_id,))
+            row = cur.fetchone()
+            return row[0] if row else None
+
+    async def flush(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # Subscriptions mapping: chat_id -> list[channel_id]
+    def add_subscription(self, chat_id: int, channel_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO subscriptions(chat_id, channel_id) VALUES (?, ?)",
+                (int(chat_id), channel_id),
+            )
+            self._conn.commit()
+
+    def remove_subscription(self, chat_id: int, channel_id: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM subscriptions WHERE chat_id=? AND channel_id=?",
+                (int(chat_id), channel_id),
+            )
+            self._conn.commit()
+            return cur.rowcount > 0
+
+    def list_subscriptions(self, chat_id: int) -> List[str]:
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT channel_id FROM subscriptions WHERE chat_id=? ORDER BY channel_id",
+                (int(chat_id),),
+            )
+            return [row[0] for row in cur.fetchall()]
+
+    def all_subscribers_for(self, channel_id: str) -> Set[int]:
+        with self._lock:
+            cur = self._conn.execute("SELECT chat_id FROM subscriptions WHERE channel_id=?", (channel_id,))
+            return {row[0] for row in cur.fetchall()}
+
+    def all_subscriptions(self) -> Dict[int, List[str]]:
+        with self._lock:
+            cur = self._conn.execute("SELECT chat_id, channel_id FROM subscriptions ORDER BY chat_id, channel_id")
+            result: Dict[int, List[str]] = {}
+            for chat_id, channel_id in cur.fetchall():
+                result.setdefault(chat_id, []).append(channel_id)
+            return result
+
+    def view_for_chat(self, chat_id: int) -> Dict[str, List[int]]:
+        """One chat's subscriptions with their destinations, in a single query."""
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT s.channel_id, d.chat_id FROM subscriptions s "
+                "LEFT JOIN destinations d ON d.channel_id = s.channel_id "
+                "WHERE s.chat_id=? ORDER BY s.channel_id, d.chat_id",
+                (int(chat_id),),
+            )
+            result: Dict[str, List[int]] = {}
+            for channel_id, dest_chat_id in cur.fetchall():
+                dests = result.setdefault(channel_id, [])
+                if dest_chat_id is not None:
+                    dests.append(dest_chat_id)
+            return result
+
+    def subscribers_map(self) -> Dict[str, Set[int]]:
+        """channel_id -> subscriber chat ids, in one query for the whole table."""
+        with self._lock:
+            cur = self._conn.execute("SELECT channel_id, chat_id FROM subscriptions")
+            result: Dict[str, Set[int]] = {}
+            for channel_id, chat_id in cur.fetchall():
+                result.setdefault(channel_id, set()).add(chat_id)
+            return result
+
+    def destinations_map(self) -> Dict[str, Set[int]]:
+        """channel_id -> destination chat ids, in one query for the whole table."""
+        with self._lock:
+            cur = self._conn.execute("SELECT channel_id, chat_id FROM destinations")
+            result: Dict[str, Set[int]] = {}
+            for channel_id, chat_id in cur.fetchall():
+                result.setdefault(channel_id, set()).add(chat_id)
+            return result
+
+    def all_channels(self) -> Set[str]:
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT channel_id FROM subscriptions UNION SELECT channel_id FROM destinations"
+            )
+            return {row[0] for row in cur.fetchall()}
+
+    # last_live mapping: channel_id -> video_id
+    def get_last_live(self, channel_id: str) -> Optional[str]:
+        return self._get_state(channel_id, "last_live")
+
+    def set_last_live(self, channel_id: str, video_id: str) -> None:
+        self._set_state(channel_id, "last_live", video_id)
+
+    # last_live_at mapping: channel_id -> ISO timestamp
+    def get_last_live_at(self, channel_id: str) -> Optional[str]:
+        return self._get_state(channel_id, "last_live_at")
+
+    def set_last_live_at(self, channel_id: str, iso_ts: str) -> None:
+        self._set_state(channel_id, "last_live_at", iso_ts)
+
+    # cooldown_until mapping: channel_id -> ISO timestamp
+    def get_cooldown_until(self, channel_id: str) -> Optional[str]:
+        return self._get_state(channel_id, "cooldown_until")
+
+    def get_cooldown_until_dt(self, channel_id: str) -> Optional[datetime]:
+        with self._lock:
+            if channel_id in self._cooldown_dt:
+                return self._cooldown_dt[channel_id]
+            iso_ts = self._get_state(channel_id, "cooldown_until")
+            dt: Optional[datetime] = None
+            if iso_ts:
+                try:
+                    dt = datetime.fromisoformat(iso_ts)
+                except ValueError:
+                    dt = None
+            if dt is not None and dt.tzinfo is None:
+                # Naive timestamps can't be compared against aware now(); drop them
+                dt = None
+            self._cooldown_dt[channel_id] = dt
+            return dt
+
+    def set_cooldown_until(self, channel_id: str, iso_ts: str) -> None:
+        with self._lock:
+            self._set_state(channel_id, "cooldown_until", iso_ts)
+            try:
+                dt: Optional[datetime] = datetime.fromisoformat(iso_ts)
+            except ValueError:
+                dt = None
+            if dt is not None and dt.tzinfo is None:
+                # Same guard as get_cooldown_until_dt: never cache a naive
+                # datetime, it would raise when compared with aware now()
+                dt = None
+            self._cooldown_dt[channel_id] = dt
+
+    # destinations mapping: channel_id -> list[int chat_id]
+    def add_destination(self, channel_id: str, chat_id: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO destinations(channel_id, chat_id) VALUES (?, ?)",
+                (channel_id, int(chat_id)),
+            )
+            self._conn.commit()
+
+    def remove_destination(self, channel_id: str, chat_id: int) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM destinations WHERE channel_id=? AND chat_id=?",
+                (channel_id, int(chat_id)),
+            )
+            self._conn.commit()
+            return cur.rowcount > 0
+
+    def list_destinations(self, channel_id: str) -> List[int]:
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT chat_id FROM destinations WHERE channel_id=? ORDER BY chat_id",
+                (channel_id,),
+            )
+            return [row[0] for row in cur.fetchall()]
+
+    def clear_destinations(self, channel_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM destinations WHERE channel_id=?", (channel_id,))
+            self._conn.commit()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import xml.etree.ElementTree as ET
+from typing import Awaitable, Callable, Optional, Set
+
+import httpx
+from aiohttp import web
+
+HUB_URL = "https://pubsubhubbub.appspot.com/"
+TOPIC_TEMPLATE = "https://www.youtube.com/xml/feeds/videos.xml?channel_id={channel_id}"
+
+# Hub leases cap out around 10 days; renew well before expiry.
+LEASE_SECONDS = 5 * 24 * 3600
+RENEW_INTERVAL = 24 * 3600
+
+_ATOM_NS = "{http://www.w3.org/2005/Atom}"
+_YT_NS = "{http://www.youtube.com/xml/schemas/2015}"
+
+
+class WebSubManager:
+    """Subscribes tracked channels to YouTube's PubSubHubbub hub and turns
+    push callbacks into (channel_id, video_id) events.
+
+    get_channels returns the currently tracked channel ids; on_video is
+    awaited for every new video announced by the hub. When secret is set it
+    is registered with the hub and pushes with a missing or bad
+    X-Hub-Signature are ignored.
+    """
+
+    def __init__(
+        self,
+        callback_url: str,
+        port: int,
+        get_channels: Callable[[], Set[str]],
+        on_video: Callable[[str, str], Awaitable[None]],
+        secret: Optional[str] = None,
+    ) -> None:
+        self._callback_url = callback_url
+        self._port = port
+        self._get_channels = get_channels
+        self._on_video = on_video
+        self._secret = secret
+        self._client = httpx.AsyncClient(timeout=15)
+        self._runner: Optional[web.AppRunner] = None
+        self._renew_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/websub/callback", self._handle_verify)
+        app.router.add_post("/websub/callback", self._handle_notify)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "0.0.0.0", self._port)
+        await site.start()
+        self._renew_task = asyncio.create_task(self._renew_loop())
+
+    async def stop(self) -> None:
+        if self._renew_task is not None:
+            self._renew_task.cancel()
+            try:
+                await self._renew_task
+            except asyncio.CancelledError:
+                pass
+        if self._runner is not None:
+            await self._runner.cleanup()
+        await self._client.aclose()
+
+    async def subscribe(self, channel_id: str) -> bool:
+        data = {
+            "hub.mode": "subscribe",
+            "hub.topic": TOPIC_TEMPLATE.format(channel_id=channel_id),
+            "hub.callback": self._callback_url,
+            "hub.lease_seconds": str(LEASE_SECONDS),
+        }
+        if self._secret:
+            data["hub.secret"] = self._secret
+        try:
+            r = await self._client.post(HUB_URL, data=data)
+            return r.status_code in (202, 204)
+        except httpx.HTTPError:
+            return False
+
+    async def subscribe_all(self) -> None:
+        for channel_id in self._get_channels():
+            await self.subscribe(channel_id)
+
+    async def _renew_loop(self) -> None:
+        # Also performs the initial subscriptions on startup.
+        while True:
+            try:
+                await self.subscribe_all()
+            except Exception:
+                pass
+            await asyncio.sleep(RENEW_INTERVAL)
+
+    async def _handle_verify(self, request: web.Request) -> web.Response:
+        challenge = request.query.get("hub.challenge")
+        topic = request.query.get("hub.topic", "")
+        if not challenge:
+            return web.Response(status=400)
+        # Only confirm (un)subscriptions for topics we actually track.
+        tracked = {TOPIC_TEMPLATE.format(channel_id=c) for c in self._get_channels()}
+        if request.query.get("hub.mode") == "subscribe" and topic not in tracked:
+            return web.Response(status=404)
+        return web.Response(text=challenge)
+
+    def _signature_valid(self, body: bytes, header: str) -> bool:
+        algo, _, digest = header.partition("=")
+        if algo not in ("sha1", "sha256", "sha384", "sha512") or not digest:
+            return False
+        expected = hmac.new(self._secret.encode(), body, getattr(hashlib, algo)).hexdigest()
+        return hmac.compare_digest(expected, digest.lower())
+
+    async def _handle_notify(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        if self._secret:
+            # Per the WebSub spec, acknowledge but ignore unsigned/bad pushes
+            if not self._signature_valid(body, request.headers.get("X-Hub-Signature", "")):
+                return web.Response(status=204)
+        try:
+            root = ET.fromstring(body)
+        except ET.ParseError:
+            return web.Response(status=400)
+        for entry in root.iter(f"{_ATOM_NS}entry"):
+            video_el = entry.find(f"{_YT_NS}videoId")
+            channel_el = entry.find(f"{_YT_NS}channelId")
+            if video_el is None or channel_el is None:
+                continue
+            try:
+                await self._on_video(channel_el.text or "", video_el.text or "")
+            except Exception:
+                # Never bounce the hub because of a handler error
+                pass
+        return web.Response(status=204)
@@ -1,16 +1,35 @@
 from __future__ import annotations
 
+import json
 import re
+import time
 from dataclasses import dataclass
-from typing import Optional, List
+from pathlib import Path
+from typing import Dict, Optional, List, Tuple
 
 import asyncio
 import httpx
 
+try:
+    import orjson
+except ImportError:  # optional accelerator; stdlib json works fine
+    orjson = None
 
-_YT_CHANNEL_URL_RE = re.compile(r"https?://(www\.)?youtube\.com/(channel/|@)([A-Za-z0-9_\-\.]+)")
+
+# One pass classifies user input as a channel id, an @handle (bare or in a
+# youtube.com URL) or free text for search.
+_YT_HINT_RE = re.compile(
+    r"^(?:"
+    r"https?://(?:www\.)?youtube\.com/(?:channel/(UC[A-Za-z0-9_\-]{18,})|@([A-Za-z0-9_\-\.]+))(?:[/?#].*)?"
+    r"|(UC[A-Za-z0-9_\-]{18,})"
+    r"|@([A-Za-z0-9_\-\.]+)"
+    r")$"
+)
 _YT_VIDEO_URL = "https://www.youtube.com/watch?v={video_id}"
 
+# Channel titles change rarely; keep cached values for a week.
+_TITLE_CACHE_TTL = 7 * 24 * 3600
+
 
 @dataclass
 class LiveInfo:
@@ -22,7 +41,7 @@ class LiveInfo:
 
 
 class YouTubeClient:
-    def __init__(self, api_keys: str | List[str]) -> None:
+    def __init__(self, api_keys: str | List[str], cache_path: Optional[Path] = None) -> None:
         if isinstance(api_keys, str):
             self._keys = [api_keys]
         else:
@@ -30,7 +49,45 @@ class YouTubeClient:
         if not self._keys:
             raise ValueError("YouTubeClient requires at least one API key")
         self._key_index = 0
-        self._client = httpx.AsyncClient(timeout=15)
+        # One shared pool for all API calls; HTTP/2 multiplexes concurrent
+        # polls over a single googleapis.com connection when h2 is installed.
+        timeout = httpx.Timeout(15.0, connect=5.0)
+        limits = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+        try:
+            self._client = httpx.AsyncClient(http2=True, timeout=timeout, limits=limits)
+        except ImportError:
+            self._client = httpx.AsyncClient(timeout=timeout, limits=limits)
+        # channel_id -> (fetched_at, title); persisted so restarts don't re-spend quota
+        self._cache_path = Path(cache_path) if cache_path else None
+        self._cache_lock = asyncio.Lock()
+        self._title_cache: Dict[str, Tuple[float, str]] = {}
+        # handle/name -> channel id; effectively immutable, so no TTL
+        self._resolve_cache: Dict[str, str] = {}
+        self._load_cache()
+
+    def _load_cache(self) -> None:
+        if self._cache_path is None or not self._cache_path.exists():
+            return
+        try:
+            raw = self._cache_path.read_bytes()
+            data = orjson.loads(raw) if orjson is not None else json.loads(raw.decode("utf-8"))
+            self._title_cache = {k: (float(v[0]), str(v[1])) for k, v in data.get("titles", {}).items()}
+            self._resolve_cache = {str(k): str(v) for k, v in data.get("resolutions", {}).items()}
+        except (OSError, ValueError):
+            self._title_cache = {}
+            self._resolve_cache = {}
+
+    def _save_cache(self) -> None:
+        if self._cache_path is None:
+            return
+        self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._cache_path.with_suffix(self._cache_path.suffix + ".tmp")
+        payload = {"titles": self._title_cache, "resolutions": self._resolve_cache}
+        if orjson is not None:
+            tmp.write_bytes(orjson.dumps(payload))
+        else:
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self._cache_path)
 
     @property
     def api_key(self) -> str:
@@ -47,55 +104,96 @@ class YouTubeClient:
     async def aclose(self) -> None:
         await self._client.aclose()
 
+    _QUOTA_REASONS = frozenset({"quotaExceeded", "dailyLimitExceeded", "rateLimitExceeded", "keyInvalid"})
+
+    async def _try_once(self, url: str, params_with_key: dict) -> tuple[Optional[httpx.Response], str]:
+        """Single request attempt; outcome is "ok", "quota", "retry" or "fatal"."""
+        try:
+            r = await self._client.get(url, params=params_with_key)
+        except (httpx.ConnectError, httpx.ReadTimeout, httpx.WriteTimeout):
+            return None, "retry"
+        if r.status_code == 403:
+            try:
+                data = r.json()
+                reasons = {e.get("reason") for e in data.get("error", {}).get("errors", []) if isinstance(e, dict)}
+            except Exception:
+                reasons = set()
+            if reasons & self._QUOTA_REASONS:
+                return None, "quota"
+        try:
+            r.raise_for_status()
+        except httpx.HTTPStatusError:
+            # Non-quota HTTP errors: don't rotate, give up
+            return None, "fatal"
+        return r, "ok"
+
     async def _get(self, url: str, *, params: dict, retries: int = 3) -> Optional[httpx.Response]:
-        delay = 0.5
-        keys_tried = 0
-        # Try across keys; for each key, retry transient errors
-        while keys_tried < len(self._keys):
+        # Outer loop rotates keys on quota exhaustion; inner loop retries
+        # transient errors with backoff that resets for each key.
+        for _ in range(len(self._keys)):
             params_with_key = dict(params)
             params_with_key["key"] = self.api_key
+            delay = 0.5
             for attempt in range(retries):
-                try:
-                    r = await self._client.get(url, params=params_with_key)
-                    # If quota exceeded for this key, rotate to next and try again
-                    if r.status_code == 403:
-                        try:
-                            data = r.json()
-                            reasons = {e.get("reason") for e in data.get("error", {}).get("errors", []) if isinstance(e, dict)}
-                        except Exception:
-                            reasons = set()
-                        quota_reasons = {"quotaExceeded", "dailyLimitExceeded", "rateLimitExceeded", "keyInvalid"}
-                        if reasons & quota_reasons:
-                            self._advance_key()
-                            keys_tried += 1
-                            break  # break inner retry loop to switch key
-                    r.raise_for_status()
+                r, outcome = await self._try_once(url, params_with_key)
+                if outcome == "ok":
                     return r
-                except (httpx.ConnectError, httpx.ReadTimeout, httpx.WriteTimeout):
-                    if attempt == retries - 1:
-                        return None
-                    await asyncio.sleep(delay)
-                    delay *= 2
-                except httpx.HTTPStatusError:
-                    # Non-quota HTTP errors: don't rotate, return None
+                if outcome == "fatal":
                     return None
+                if outcome == "quota":
+                    self._advance_key()
+                    break  # next key
+                # transient: back off and retry with the same key
+                if attempt == retries - 1:
+                    return None
+                await asyncio.sleep(delay)
+                delay *= 2
             else:
-                # Finished retries without quota rotation; stop trying keys
+                # Exhausted retries without a quota rotation
                 return None
         return None
 
     @staticmethod
-    def extract_channel_hint(text: str) -> Optional[str]:
-        m = _YT_CHANNEL_URL_RE.search(text.strip())
-        if not m:
-            return None
-        return m.group(3)
+    def classify_channel_hint(text: str) -> tuple[str, str]:
+        """Return ("id"|"handle"|"query", value) for a user-supplied channel hint."""
+        t = text.strip()
+        m = _YT_HINT_RE.match(t)
+        if m is None:
+            return ("query", t)
+        channel_id = m.group(1) or m.group(3)
+        if channel_id:
+            return ("id", channel_id)
+        return ("handle", m.group(2) or m.group(4))
 
     async def resolve_channel_id(self, identifier_or_url: str) -> Optional[str]:
-        hint = self.extract_channel_hint(identifier_or_url) or identifier_or_url.strip()
-        if hint.startswith("UC") and len(hint) >= 20:
+        kind, hint = self.classify_channel_hint(identifier_or_url)
+        if kind == "id":
+            # Already a channel id: no API call needed
             return hint
-        # Try search by handle or name
+        # Handles are case-insensitive on YouTube, so normalize like free text
+        cache_key = ("@" + hint.lower()) if kind == "handle" else hint.lower()
+        cached = self._resolve_cache.get(cache_key)
+        if cached:
+            return cached
+        channel_id = await self._resolve_uncached(kind, hint)
+        if channel_id:
+            async with self._cache_lock:
+                self._resolve_cache[cache_key] = channel_id
+                await asyncio.to_thread(self._save_cache)
+        return channel_id
+
+    async def _resolve_uncached(self, kind: str, hint: str) -> Optional[str]:
+        if kind == "handle":
+            # channels.list?forHandle costs 1 quota unit vs 100 for search.list
+            params = {"part": "id", "forHandle": "@" + hint, "key": self.api_key}
+            r = await self._get("https://www.googleapis.com/youtube/v3/channels", params=params)
+            if r is None:
+                return None
+            items = r.json().get("items", [])
+            if not items:
+                return None
+            return items[0]["id"]
+        # Free-text name: fall back to search
         params = {
             "part": "snippet",
             "q": hint,
@@ -112,17 +210,28 @@ class YouTubeClient:
         return items[0]["snippet"]["channelId"]
 
     async def get_channel_title(self, channel_id: str) -> Optional[str]:
+        cached = self._title_cache.get(channel_id)
+        if cached is not None and time.time() - cached[0] < _TITLE_CACHE_TTL:
+            return cached[1]
         params = {"part": "snippet", "id": channel_id, "key": self.api_key}
         r = await self._get("https://www.googleapis.com/youtube/v3/channels", params=params)
         if r is None:
-            return None
+            return cached[1] if cached else None
         items = r.json().get("items", [])
         if not items:
             return None
-        return items[0]["snippet"].get("title")
+        title = items[0]["snippet"].get("title")
+        if title:
+            async with self._cache_lock:
+                self._title_cache[channel_id] = (time.time(), title)
+                # Disk write happens in a worker thread; the lock still
+                # serializes writers so snapshots stay consistent
+                await asyncio.to_thread(self._save_cache)
+        return title
 
-    async def get_live_now(self, channel_id: str) -> Optional[LiveInfo]:
-        # Search for live events
+    async def get_live_now(self, channel_id: str, *, include_schedule: bool = False) -> Optional[LiveInfo]:
+        # Search for live events; the search snippet already carries the video
+        # and channel titles, so one call covers the common case.
         params = {
             "part": "snippet",
             "channelId": channel_id,
@@ -139,20 +248,46 @@ class YouTubeClient:
         if not items:
             return None
         video_id = items[0]["id"]["videoId"]
-        # Fetch video details for title/schedule
-        params2 = {"part": "snippet,liveStreamingDetails", "id": video_id, "key": self.api_key}
-        r2 = await self._get("https://www.googleapis.com/youtube/v3/videos", params=params2)
-        vitems = r2.json().get("items", []) if r2 is not None else []
-        title = None
+        snippet = items[0].get("snippet", {})
+        title = snippet.get("title")
+        chan_title = snippet.get("channelTitle") or await self.get_channel_title(channel_id)
         sched = None
-        if vitems:
-            s = vitems[0].get("snippet", {})
-            title = s.get("title")
-            lsd = vitems[0].get("liveStreamingDetails", {})
-            sched = lsd.get("scheduledStartTime") or lsd.get("actualStartTime")
-        chan_title = await self.get_channel_title(channel_id)
+        if include_schedule:
+            sched = await self.get_scheduled_start_time(video_id)
         return LiveInfo(channel_id=channel_id, channel_title=chan_title, video_id=video_id, video_title=title, scheduled_start_time=sched)
 
+    async def get_video_live_info(self, video_id: str) -> Optional[LiveInfo]:
+        # Cheap (1 unit) confirmation that a pushed video is actually live.
+        params = {"part": "snippet,liveStreamingDetails", "id": video_id, "key": self.api_key}
+        r = await self._get("https://www.googleapis.com/youtube/v3/videos", params=params)
+        if r is None:
+            return None
+        items = r.json().get("items", [])
+        if not items:
+            return None
+        snippet = items[0].get("snippet", {})
+        if snippet.get("liveBroadcastContent") != "live":
+            return None
+        lsd = items[0].get("liveStreamingDetails", {})
+        return LiveInfo(
+            channel_id=snippet.get("channelId", ""),
+            channel_title=snippet.get("channelTitle"),
+            video_id=video_id,
+            video_title=snippet.get("title"),
+            scheduled_start_time=lsd.get("scheduledStartTime") or lsd.get("actualStartTime"),
+        )
+
+    async def get_scheduled_start_time(self, video_id: str) -> Optional[str]:
+        params = {"part": "liveStreamingDetails", "id": video_id, "key": self.api_key}
+        r = await self._get("https://www.googleapis.com/youtube/v3/videos", params=params)
+        if r is None:
+            return None
+        items = r.json().get("items", [])
+        if not items:
+            return None
+        lsd = items[0].get("liveStreamingDetails", {})
+        return lsd.get("scheduledStartTime") or lsd.get("actualStartTime")
+
     @staticmethod
     def video_url(video_id: str) -> str:
         return _YT_VIDEO_URL.format(video_id=video_id)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import html
 import os
 from pathlib import Path
 from typing import Optional
@@ -8,6 +9,7 @@ from datetime import datetime, timedelta, timezone
 
 from aiogram import Bot, Dispatcher
 from aiogram.enums.parse_mode import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 
@@ -15,48 +17,103 @@ from app.storage import Storage
 from app.youtube_client import YouTubeClient
 from app.bot import router as bot_router
 from app.middlewares import DepsMiddleware, AuthMiddleware
+from app.ratelimit import safe_send
+from app.websub import WebSubManager
+
+
+# How many channels are polled / messages are sent concurrently per tick.
+POLL_CONCURRENCY = 10
+SEND_CONCURRENCY = 10
+
+# With push notifications enabled, polling is only a safety net.
+SAFETY_NET_POLL_INTERVAL = 3600
+
+
+async def announce_live(
+    bot: Bot,
+    storage: Storage,
+    yt: YouTubeClient,
+    channel_id: str,
+    live,
+    cooldown_seconds: int,
+    targets: Optional[set[int]] = None,
+) -> None:
+    """Record a newly-detected live and fan the notification out. Shared by
+    the poll loop and the WebSub push path."""
+    last = storage.get_last_live(channel_id)
+    if last == live.video_id:
+        return
+    storage.set_last_live(channel_id, live.video_id)
+    storage.set_last_live_at(channel_id, datetime.now(timezone.utc).isoformat())
+    # Set cooldown to avoid rechecking soon after a live
+    if cooldown_seconds > 0:
+        storage.set_cooldown_until(
+            channel_id,
+            (datetime.now(timezone.utc) + timedelta(seconds=cooldown_seconds)).isoformat(),
+        )
+    if targets is None:
+        targets = set(storage.all_subscribers_for(channel_id)) | set(storage.list_destinations(channel_id))
+    if not targets:
+        return
+    # Format the payload once; every chat receives the identical message
+    url = yt.video_url(live.video_id)
+    title = html.escape(live.video_title or "Прямая трансляция")
+    chan = html.escape(live.channel_title or channel_id)
+    text = f"{chan} в эфире: {title}\n{url}"
+    send_sem = asyncio.Semaphore(SEND_CONCURRENCY)
+
+    async def _send(chat_id: int) -> None:
+        async with send_sem:
+            try:
+                # Silent notifications reduce rate-limit pressure on broadcasts
+                await safe_send(bot, chat_id, text, disable_notification=True)
+            except TelegramForbiddenError:
+                # Bot was blocked or kicked: stop notifying this chat
+                _prune_chat(chat_id)
+            except TelegramBadRequest as e:
+                if "chat not found" in str(e).lower():
+                    _prune_chat(chat_id)
+            except Exception:
+                # Ignore transient send errors per chat
+                pass
+
+    def _prune_chat(chat_id: int) -> None:
+        removed_sub = storage.remove_subscription(chat_id, channel_id)
+        removed_dest = storage.remove_destination(channel_id, chat_id)
+        if removed_sub or removed_dest:
+            print(f"notifier: pruned unreachable chat {chat_id} for channel {channel_id}")
+
+    await asyncio.gather(*(_send(chat_id) for chat_id in targets), return_exceptions=True)
 
 
 async def notifier_loop(bot: Bot, storage: Storage, yt: YouTubeClient, interval: int, cooldown_seconds: int) -> None:
+    poll_sem = asyncio.Semaphore(POLL_CONCURRENCY)
+
+    async def _poll(channel_id: str, targets: set[int]) -> None:
+        async with poll_sem:
+            # Cooldown check (parsed datetime is cached by Storage)
+            cd = storage.get_cooldown_until_dt(channel_id)
+            if cd is not None and datetime.now(timezone.utc) < cd:
+                return
+
+            live = await yt.get_live_now(channel_id)
+            if not live:
+                return
+            await announce_live(bot, storage, yt, channel_id, live, cooldown_seconds, targets=targets)
+
     while True:
         try:
-            channels = storage.all_channels()
-            for channel_id in channels:
-                # Cooldown check
-                cd = storage.get_cooldown_until(channel_id)
-                if cd:
-                    try:
-                        if datetime.now(timezone.utc) < datetime.fromisoformat(cd):
-                            continue
-                    except Exception:
-                        pass
-
-                live = await yt.get_live_now(channel_id)
-                if not live:
-                    continue
-                last = storage.get_last_live(channel_id)
-                if last == live.video_id:
-                    continue
-                storage.set_last_live(channel_id, live.video_id)
-                storage.set_last_live_at(channel_id, datetime.now(timezone.utc).isoformat())
-                # Set cooldown to avoid rechecking soon after a live
-                if cooldown_seconds > 0:
-                    storage.set_cooldown_until(
-                        channel_id,
-                        (datetime.now(timezone.utc) + timedelta(seconds=cooldown_seconds)).isoformat(),
-                    )
-                url = yt.video_url(live.video_id)
-                import html
-                title = html.escape(live.video_title or "Прямая трансляция")
-                chan = html.escape(live.channel_title or channel_id)
-                text = f"{chan} в эфире: {title}\n{url}"
-                targets = set(storage.all_subscribers_for(channel_id)) | set(storage.list_destinations(channel_id))
-                for chat_id in targets:
-                    try:
-                        await bot.send_message(chat_id, text)
-                    except Exception:
-                        # Ignore send errors per chat
-                        pass
+            # One pass over the tables per tick instead of a per-channel scan
+            subs_by_channel = storage.subscribers_map()
+            dests_by_channel = storage.destinations_map()
+            channels = set(subs_by_channel) | set(dests_by_channel)
+            await asyncio.gather(
+                *(
+                    _poll(cid, subs_by_channel.get(cid, set()) | dests_by_channel.get(cid, set()))
+                    for cid in channels
+                ),
+                return_exceptions=True,
+            )
         except Exception:
             # Keep loop alive on errors
             pass
@@ -85,14 +142,42 @@ async def main() -> None:
         raise RuntimeError("Missing YT_API_KEY or YT_API_KEYS in environment/.env")
 
     storage = Storage(storage_path)
-    yt = YouTubeClient(api_keys)
+    yt = YouTubeClient(api_keys, cache_path=storage_path.parent / "titles.json")
 
     bot = Bot(token, parse_mode=ParseMode.HTML)
+
+    # Optional WebSub (PubSubHubbub) push notifications: when a public callback
+    # URL is configured, YouTube pushes new videos to us and the poll loop is
+    # demoted to an hourly safety net.
+    websub_callback = os.getenv("WEBSUB_CALLBACK_URL", "").strip()
+    websub_port = int(os.getenv("WEBSUB_PORT") or 8080)
+    websub_secret = os.getenv("WEBSUB_SECRET", "").strip() or None
+    websub: Optional[WebSubManager] = None
+    if websub_callback:
+        async def on_pushed_video(channel_id: str, video_id: str) -> None:
+            if not channel_id or channel_id not in storage.all_channels():
+                return
+            if storage.get_last_live(channel_id) == video_id:
+                return
+            live = await yt.get_video_live_info(video_id)
+            if not live:
+                return
+            # Don't trust the pushed pairing: the video must belong to the
+            # claimed channel, or a forged feed could broadcast someone
+            # else's live stream to this channel's subscribers.
+            if live.channel_id != channel_id:
+                return
+            await announce_live(bot, storage, yt, channel_id, live, cooldown_seconds)
+
+        websub = WebSubManager(
+            websub_callback, websub_port, storage.all_channels, on_pushed_video, secret=websub_secret
+        )
+        poll_interval = max(poll_interval, SAFETY_NET_POLL_INTERVAL)
     dp = Dispatcher(storage=MemoryStorage())
 
     dp.include_router(bot_router)
-    dp.message.middleware(DepsMiddleware(storage=storage, yt=yt))
-    dp.channel_post.middleware(DepsMiddleware(storage=storage, yt=yt))
+    dp.message.middleware(DepsMiddleware(storage=storage, yt=yt, websub=websub))
+    dp.channel_post.middleware(DepsMiddleware(storage=storage, yt=yt, websub=websub))
     # Restrict usage to allowed user IDs if provided
     allowed_env = os.getenv("ALLOWED_USER_IDS", "").strip()
     allowed_ids = None
@@ -109,16 +194,21 @@ async def main() -> None:
 
     async def on_startup(*_args, **_kwargs):
         nonlocal notifier_task
+        if websub is not None:
+            await websub.start()
         notifier_task = asyncio.create_task(notifier_loop(bot, storage, yt, poll_interval, cooldown_seconds))
 
     async def on_shutdown(*_args, **_kwargs):
         nonlocal notifier_task
+        if websub is not None:
+            await websub.stop()
         if notifier_task is not None:
             notifier_task.cancel()
             try:
                 await notifier_task
             except asyncio.CancelledError:
                 pass
+        await storage.flush()
         await yt.aclose()
 
     dp.startup.register(on_startup)